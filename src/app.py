@@ -1,14 +1,28 @@
 """Phylogenetic tree browser — FastAPI backend."""
 
+import asyncio
 import csv
+import hashlib
 import json
 import os
 import re
+import sys
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import accumulate, count
 from pathlib import Path
 from typing import Optional
 
+import orjson
 from fastapi import FastAPI, Query, Request
-from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import (
+    FileResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
 
 # ---------------------------------------------------------------------------
@@ -20,11 +34,22 @@ EMPTY_STATE = {
     "input_dir": None,
     "gene": None,
     "tree_data": None,
-    "tree_json": None,
+    "tree_json_bytes": None,
+    "tree_etag": None,
+    "tree_flat_json_bytes": None,
+    "node_by_id": {},
+    "parent_by_id": {},
+    "tip_order": [],
     "protein_seqs": None,
-    "protein_seqs_ungapped": None,
+    "ungapped_corpus": None,
+    "fasta_records": {},
     "species_to_tips": {},
     "tip_to_species": {},
+    "species_bits": {},
+    "species_scan": ({}, [], [], []),
+    "species_json_bytes": None,
+    "tip_names_json_bytes": None,
+    "tip_lengths_json_bytes": None,
     "num_seqs": 0,
     "num_species": 0,
     "nwk_name": None,
@@ -51,53 +76,80 @@ def loaded_status_payload():
 # ---------------------------------------------------------------------------
 # Newick parser (pure Python, no dependencies)
 # ---------------------------------------------------------------------------
-_node_counter = 0
+class Node:
+    """A tree node; slots keep large trees compact and attribute access fast.
+
+    species, sp_mask and tip_span are filled in after parsing by
+    annotate_species and precompute_tips.
+    """
+
+    __slots__ = ("id", "name", "branch_length", "support", "children",
+                 "species", "sp_mask", "tip_span")
+
+    def __init__(self, id, name, branch_length, support, children):
+        self.id = id
+        self.name = name
+        self.branch_length = branch_length
+        self.support = support
+        self.children = children
+        self.species = None
+        self.sp_mask = 0
+        self.tip_span = None
+
+
+_NEWICK_TOKEN_RE = re.compile(r"[(),;]|[^(),:;]+|:[^(),;]*")
 
 
 def _parse_newick(s):
-    """Parse a Newick string into a nested dict tree."""
-    global _node_counter
-    s = s.strip().rstrip(";")
-    node, _ = _parse_node(s, 0)
-    return node
-
-
-def _parse_node(s, pos):
-    global _node_counter
-    children = []
-    if pos < len(s) and s[pos] == "(":
-        pos += 1  # skip '('
-        while True:
-            child, pos = _parse_node(s, pos)
-            children.append(child)
-            if pos < len(s) and s[pos] == ",":
-                pos += 1
-            else:
-                break
-        if pos < len(s) and s[pos] == ")":
-            pos += 1
+    """Parse a Newick string into a tree of Node objects.
 
-    # Read label and branch length
+    The string is tokenized in one C-level regex pass and nodes are assembled with an
+    explicit stack, so deeply nested trees do not hit the recursion limit.
+
+    >>> [c.name for c in _parse_newick("(A,B));").children]  # stray ")" ignored
+    ['A', 'B']
+    """
+    s = s.strip().rstrip(";")
+    stack = [[]]  # children lists of the internal nodes still open
+    children = []  # children of the node whose label is being read
     label = ""
-    while pos < len(s) and s[pos] not in (",", ")", ":", ";"):
-        label += s[pos]
-        pos += 1
+    bl_str = None
+    ids = count()  # node ids in post-order
+    # findall hands back plain strings, avoiding a Match object per token
+    for tok in _NEWICK_TOKEN_RE.findall(s):
+        if tok == "(":
+            stack.append([])
+        elif tok == "," or tok == ")":
+            if tok == ")" and len(stack) == 1:
+                break  # unmatched ")": the tree ends here
+            stack[-1].append(_make_node(next(ids), children, label, bl_str))
+            children, label, bl_str = [], "", None
+            if tok == ")":
+                children = stack.pop()
+        elif tok == ";":
+            break
+        elif tok[0] == ":":
+            bl_str = tok[1:]
+        else:
+            label = tok
+
+    node = _make_node(next(ids), children, label, bl_str)
+    # Close any parentheses left open by a truncated string
+    while len(stack) > 1:
+        stack[-1].append(node)
+        node = _make_node(next(ids), stack.pop(), "", None)
+    return stack[0][0] if stack[0] else node
 
+
+def _make_node(nid, children, label, bl_str):
+    """Build Node nid from its children, label and branch-length text."""
     branch_length = 0.0
-    if pos < len(s) and s[pos] == ":":
-        pos += 1
-        bl_str = ""
-        while pos < len(s) and s[pos] not in (",", ")", ";"):
-            bl_str += s[pos]
-            pos += 1
+    if bl_str is not None:
         try:
             branch_length = float(bl_str)
         except ValueError:
             branch_length = 0.0
 
-    nid = _node_counter
-    _node_counter += 1
-
     # For internal nodes, label is often bootstrap support
     support = None
     name = ""
@@ -107,15 +159,10 @@ def _parse_node(s, pos):
         except ValueError:
             name = label
     else:
-        name = label
+        # Tip names recur as FASTA headers and species-map keys; share one copy
+        name = sys.intern(label)
 
-    return {
-        "id": nid,
-        "name": name,
-        "branch_length": branch_length,
-        "support": support,
-        "children": children,
-    }, pos
+    return Node(nid, name, branch_length, support, children)
 
 
 # ---------------------------------------------------------------------------
@@ -123,17 +170,50 @@ def _parse_node(s, pos):
 # ---------------------------------------------------------------------------
 def parse_fasta(path):
     """Return dict of {header: sequence}."""
+    # Decode in one call rather than through the text layer's incremental
+    # decoder; only then normalise line endings as text mode would.
+    with open(path, "rb") as f:
+        data = f.read().decode()
+    if "\r" in data:
+        data = data.replace("\r\n", "\n").replace("\r", "\n")
+
+    # One split yields whole records; text before the first header is dropped
+    records = data.split("\n>")
+    if records[0].startswith(">"):
+        records[0] = records[0][1:]
+    else:
+        records = records[1:]
+
     seqs = {}
-    current = None
-    with open(path) as f:
-        for line in f:
-            line = line.rstrip("\n")
-            if line.startswith(">"):
-                current = line[1:].split()[0]
-                seqs[current] = []
-            elif current is not None:
-                seqs[current].append(line)
-    return {k: "".join(v) for k, v in seqs.items()}
+    for record in records:
+        header, _, body = record.partition("\n")
+        seqs[sys.intern(header.split()[0])] = body.replace("\n", "")
+    return seqs
+
+
+_FASTA_HEADER_RE = re.compile(rb"^>[^\S\n]*(\S+)", re.MULTILINE)
+
+
+def iter_fasta_headers(path):
+    """Yield the record names in a FASTA file as undecoded bytes.
+
+    Only header lines are matched; sequence bytes are never copied into
+    Python objects.
+    """
+    data = Path(path).read_bytes()
+    for m in _FASTA_HEADER_RE.finditer(data):
+        yield m.group(1)
+
+
+# Streamed FASTA exports are sent in chunks of roughly this many bytes
+FASTA_CHUNK_SIZE = 64 * 1024
+
+
+def format_fasta_record(name, seq):
+    """Return one encoded FASTA record with the sequence wrapped at 80 columns."""
+    lines = [f">{name}"]
+    lines.extend(seq[i:i + 80] for i in range(0, len(seq), 80))
+    return ("\n".join(lines) + "\n").encode()
 
 
 # ---------------------------------------------------------------------------
@@ -144,20 +224,14 @@ def build_species_map(tree_data, ortho_dir):
     species_to_tips = {}
     tip_to_species = {}
 
-    # Collect all tree tip names for cross-referencing
-    tree_tips = set()
-
-    def collect_tips(node):
-        if not node["children"]:
-            tree_tips.add(node["name"])
-        for c in node["children"]:
-            collect_tips(c)
-
-    collect_tips(tree_data)
+    # Key tree tips by their encoded names so FASTA headers can be matched
+    # as raw bytes; only the tree's own strings end up in the maps
+    tree_tips = {tip.encode(): tip for tip in collect_descendant_tips(tree_data)}
 
-    for fpath in sorted(ortho_dir.iterdir()):
-        if not (fpath.suffix in (".fa", ".fasta")):
-            continue
+    with os.scandir(ortho_dir) as entries:
+        fasta_names = sorted(e.name for e in entries if e.name.endswith((".fa", ".fasta")))
+    for name in fasta_names:
+        fpath = ortho_dir / name
         fname = fpath.stem  # e.g. "new_genomes.Aameric_YS121.v1.cds"
 
         # Extract species name from filename
@@ -176,15 +250,14 @@ def build_species_map(tree_data, ortho_dir):
             }
             species = REF_SPECIES.get(fname, fname)
 
-        # Read FASTA headers from this species file
-        headers = set()
-        with open(fpath) as f:
-            for line in f:
-                if line.startswith(">"):
-                    headers.add(line[1:].strip().split()[0])
+        # Every tip of this species references one shared string
+        species = sys.intern(species)
 
-        # Cross-reference with tree tips
-        matching_tips = sorted(headers & tree_tips)
+        # Cross-reference this species file's headers with tree tips as they
+        # stream past, without collecting or decoding every header first
+        matching_tips = sorted({
+            tree_tips[header] for header in iter_fasta_headers(fpath) if header in tree_tips
+        })
         if matching_tips:
             species_to_tips[species] = matching_tips
             for tip in matching_tips:
@@ -196,104 +269,325 @@ def build_species_map(tree_data, ortho_dir):
 # ---------------------------------------------------------------------------
 # Annotate tree nodes with species info
 # ---------------------------------------------------------------------------
-def annotate_species(node, tip_to_species):
-    """Add 'species' field to tips and 'descendant_species' set to all nodes."""
-    if not node["children"]:
-        sp = tip_to_species.get(node["name"], "unknown")
-        node["species"] = sp
-        return {sp}
-    else:
-        desc_species = set()
-        for child in node["children"]:
-            desc_species |= annotate_species(child, tip_to_species)
-        node["descendant_species"] = sorted(desc_species)
-        return desc_species
+def assign_species_bits(species_to_tips):
+    """Give every species (plus 'unknown') its own bit for species-set masks."""
+    names = sorted(set(species_to_tips) | {"unknown"})
+    return {sp: 1 << i for i, sp in enumerate(names)}
+
+
+def annotate_species(root, tip_to_species, species_bits):
+    """Add 'species' to tips and a descendant-species bitmask 'sp_mask' to all nodes."""
+    preorder = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        preorder.append(node)
+        stack.extend(node.children)
+
+    # Walk in reverse so every child's mask is ready before its parent's
+    for node in reversed(preorder):
+        if not node.children:
+            sp = tip_to_species.get(node.name, "unknown")
+            node.species = sp
+            node.sp_mask = species_bits[sp]
+        else:
+            mask = 0
+            for c in node.children:
+                mask |= c.sp_mask
+            node.sp_mask = mask
+    return root.sp_mask
 
 
 # ---------------------------------------------------------------------------
 # Find nodes containing at least one tip from each selected species
 # ---------------------------------------------------------------------------
-def find_nodes_with_species(node, required_species, excluded_species=None):
-    """Return list of node IDs whose descendants include ≥1 tip from ALL required species
-    and NO tips from any excluded species."""
-    excluded_species = excluded_species or set()
-    result = []
+def flatten_species_masks(root, species_bits):
+    """Lay out node ids and species masks in preorder for find_nodes_with_species.
 
-    def get_desc_species(n):
-        if not n["children"]:
-            return {n.get("species", "unknown")}
-        return set(n.get("descendant_species", []))
+    Returns (species_bits, ids, masks, ends) where ends[i] is the position
+    just past node i's subtree, so a whole subtree can be skipped in one step.
+    The bit assignment travels with the masks so a reader always gets a
+    matching pair from a single lookup.
+    """
+    ids, masks, ends = [], [], []
+    stack = [(root, None)]
+    while stack:
+        node, pos = stack.pop()
+        if pos is not None:
+            ends[pos] = len(ids)
+            continue
+        stack.append((node, len(ids)))
+        ids.append(node.id)
+        masks.append(node.sp_mask)
+        ends.append(None)
+        stack.extend((c, None) for c in reversed(node.children))
+    return species_bits, ids, masks, ends
 
-    def walk(n):
-        ds = get_desc_species(n)
-        if required_species.issubset(ds) and not ds.intersection(excluded_species):
-            result.append(n["id"])
-        for c in n.get("children", []):
-            walk(c)
 
-    walk(node)
+def find_nodes_with_species(species_scan, required_species, excluded_species=None):
+    """Return list of node IDs whose descendants include ≥1 tip from ALL required species
+    and NO tips from any excluded species.
+
+    species_scan is the (species_bits, ids, masks, ends) layout from
+    flatten_species_masks.
+    """
+    species_bits, ids, masks, ends = species_scan
+    excluded_species = excluded_species or set()
+    if not all(sp in species_bits for sp in required_species):
+        return []  # a species absent from the tree can never be satisfied
+    required_mask = 0
+    for sp in required_species:
+        required_mask |= species_bits[sp]
+    excluded_mask = 0
+    for sp in excluded_species:
+        excluded_mask |= species_bits.get(sp, 0)
+
+    result = []
+    i, n = 0, len(ids)
+    while i < n:
+        mask = masks[i]
+        if mask & required_mask != required_mask:
+            i = ends[i]  # descendants only carry a subset of these species
+            continue
+        if not mask & excluded_mask:
+            result.append(ids[i])
+        # Children may shed an excluded species, so keep descending
+        i += 1
     return result
 
 
 # ---------------------------------------------------------------------------
 # PROSITE pattern → regex conversion
 # ---------------------------------------------------------------------------
+@lru_cache(maxsize=256)
 def prosite_to_regex(pattern):
     """Convert PROSITE-style pattern to Python regex.
 
     Rules: x = any AA, [ABC] = one of, {ABC} = not one of,
     - separates elements, (n) = repeat n times, (n,m) = repeat n-m times,
     < = N-terminal, > = C-terminal.
+
+    The pattern is read in one left-to-right scan, emitting a regex
+    fragment per element.
     """
-    pattern = pattern.strip(".").strip()
-    parts = pattern.split("-")
+    s = pattern.strip(".").strip()
+    n = len(s)
     regex_parts = []
-    for part in parts:
-        if part == "x" or part == "X":
-            regex_parts.append(".")
-        elif part.startswith("{") and part.endswith("}"):
-            regex_parts.append(f"[^{part[1:-1]}]")
-        elif part.startswith("[") and part.endswith("]"):
-            regex_parts.append(part)
-        elif part == "<":
+    i = 0
+    while i < n:
+        c = s[i]
+        if c == "-":
+            i += 1
+            continue
+        if c == "<":
             regex_parts.append("^")
-        elif part == ">":
+            i += 1
+            continue
+        if c == ">":
             regex_parts.append("$")
+            i += 1
+            continue
+
+        if c == "[" or c == "{":
+            close = s.find("]" if c == "[" else "}", i)
+            if close == -1:
+                raise ValueError(f"unclosed {c!r} at position {i}")
+            j = close + 1
+            element = s[i:j] if c == "[" else f"[^{s[i + 1:close]}]"
         else:
-            # Check for repeat notation like x(2) or x(2,4)
-            m = re.match(r"^(.+)\((\d+)(?:,(\d+))?\)$", part)
-            if m:
-                base = m.group(1)
-                # Recurse for the base
-                base_regex = prosite_to_regex(base)
-                if m.group(3):
-                    regex_parts.append(f"(?:{base_regex}){{{m.group(2)},{m.group(3)}}}")
-                else:
-                    regex_parts.append(f"(?:{base_regex}){{{m.group(2)}}}")
-            else:
-                # Literal amino acid(s)
-                regex_parts.append(re.escape(part))
+            j = i
+            while j < n and s[j] not in "-(<>[{":
+                j += 1
+            if j == i:
+                raise ValueError(f"unexpected {c!r} at position {i}")
+            literal = s[i:j]
+            element = "." if literal in ("x", "X") else re.escape(literal)
+        i = j
+
+        # Optional repeat count: (n) or (n,m)
+        if i < n and s[i] == "(":
+            j = s.find(")", i)
+            if j == -1:
+                raise ValueError(f"unclosed '(' at position {i}")
+            counts = s[i + 1:j]
+            low, sep, high = counts.partition(",")
+            if not low.isdigit() or (sep and not high.isdigit()):
+                raise ValueError(f"invalid repeat '({counts})'")
+            element = f"(?:{element}){{{counts}}}"
+            i = j + 1
+        regex_parts.append(element)
     return "".join(regex_parts)
 
 
+@lru_cache(maxsize=256)
+def compile_motif_regex(regex_str, flags=re.IGNORECASE | re.MULTILINE):
+    """Compile a motif regex, reusing the compiled pattern across requests.
+
+    MULTILINE lets ^ and $ anchor at sequence boundaries inside the corpus.
+    """
+    return re.compile(regex_str, flags)
+
+
+# ---------------------------------------------------------------------------
+# Ungapped sequence corpus and single-scan motif search
+# ---------------------------------------------------------------------------
+# Lookaround and \A / \Z can see past a sequence boundary in the corpus, so
+# patterns using them are matched one sequence at a time instead.
+_BOUNDARY_SENSITIVE_RE = re.compile(r"\(\?<?[=!]|\\[AZ]")
+
+
+def build_ungapped_corpus(protein_seqs):
+    """Pack the ungapped sequences into one newline-separated string.
+
+    Returns (corpus, starts, tips, uppercase) where the sequence of tips[i]
+    spans corpus[starts[i]:starts[i + 1] - 1], starts is an array of offsets
+    and uppercase is True when the corpus is ASCII with no lowercase letters.
+    """
+    tips = list(protein_seqs)
+    ungapped = [seq.replace("-", "") for seq in protein_seqs.values()]
+    starts = array("q", accumulate((len(seq) + 1 for seq in ungapped), initial=0))
+    corpus = "\n".join(ungapped)
+    uppercase = corpus.isascii() and not re.search("[a-z]", corpus)
+    return corpus, starts, tips, uppercase
+
+
+def get_ungapped_corpus(seqs):
+    """Return the packed corpus tuple for the alignment seqs, built on first use.
+
+    seqs is the caller's snapshot of state["protein_seqs"]. The cache holds
+    (alignment, corpus) so a build racing a reload can never be reused for,
+    or stored over, a different dataset.
+    """
+    cached = state["ungapped_corpus"]
+    if cached is not None and cached[0] is seqs:
+        return cached[1]
+    packed = build_ungapped_corpus(seqs)
+    if state["protein_seqs"] is seqs:
+        state["ungapped_corpus"] = (seqs, packed)
+    return packed
+
+
+def scan_motif(compiled, corpus, starts, tips):
+    """Return the tips whose sequence contains a match for compiled."""
+    if _BOUNDARY_SENSITIVE_RE.search(compiled.pattern):
+        return [
+            tip for i, tip in enumerate(tips)
+            if compiled.search(corpus[starts[i]:starts[i + 1] - 1])
+        ]
+
+    matched = []
+    pos = 0
+    while pos < starts[-1]:
+        m = compiled.search(corpus, pos)
+        if m is None:
+            break
+        i = bisect_right(starts, m.start()) - 1
+        end = starts[i + 1] - 1
+        # A match running into the next sequence may hide one wholly inside
+        # this sequence, so re-check this sequence on its own.
+        if m.end() <= end or compiled.search(corpus, starts[i], end):
+            matched.append(tips[i])
+        pos = end + 1
+    return matched
+
+
+def scan_literal(literal, corpus, starts, tips):
+    """Return the tips whose sequence contains literal as an exact substring."""
+    matched = []
+    pos = corpus.find(literal)
+    while pos != -1:
+        i = bisect_right(starts, pos) - 1
+        matched.append(tips[i])
+        pos = corpus.find(literal, starts[i + 1])
+    return matched
+
+
 # ---------------------------------------------------------------------------
 # Serialise tree to JSON-friendly format
 # ---------------------------------------------------------------------------
-def tree_to_json(node):
-    """Convert tree node to JSON-serializable dict (keep it slim)."""
-    result = {
-        "id": node["id"],
-        "bl": node["branch_length"],
+def tree_to_json(root):
+    """Convert tree to JSON-serializable dict (keep it slim)."""
+    top = []
+    stack = [(root, top)]
+    while stack:
+        node, siblings = stack.pop()
+        result = {
+            "id": node.id,
+            "bl": node.branch_length,
+        }
+        if node.name:
+            result["name"] = node.name
+        if node.support is not None:
+            result["sup"] = node.support
+        if node.species:
+            result["sp"] = node.species
+        if node.children:
+            result["ch"] = []
+            stack.extend((c, result["ch"]) for c in reversed(node.children))
+        siblings.append(result)
+    return top[0]
+
+
+def tree_to_flat(root):
+    """Convert tree to parallel preorder arrays, a compact alternative to tree_to_json.
+
+    parent holds each node's parent id (None for the root); sp indexes into
+    the species list, or is -1 for internal nodes and unmapped tips.
+    """
+    ids, parents, bls, names, sups, sps = [], [], [], [], [], []
+    species = []
+    species_index = {}
+    stack = [(root, None)]
+    while stack:
+        node, parent_id = stack.pop()
+        ids.append(node.id)
+        parents.append(parent_id)
+        bls.append(node.branch_length)
+        names.append(node.name)
+        sups.append(node.support)
+        sp = node.species
+        if sp:
+            if sp not in species_index:
+                species_index[sp] = len(species)
+                species.append(sp)
+            sps.append(species_index[sp])
+        else:
+            sps.append(-1)
+        stack.extend((c, node.id) for c in reversed(node.children))
+    return {
+        "id": ids,
+        "parent": parents,
+        "bl": bls,
+        "name": names,
+        "sup": sups,
+        "sp": sps,
+        "species": species,
     }
-    if node.get("name"):
-        result["name"] = node["name"]
-    if node.get("support") is not None:
-        result["sup"] = node["support"]
-    if node.get("species"):
-        result["sp"] = node["species"]
-    if node["children"]:
-        result["ch"] = [tree_to_json(c) for c in node["children"]]
-    return result
+
+
+def encode_tree(root):
+    """Serialise the tree once; returns (JSON bytes, ETag for those bytes)."""
+    data = orjson.dumps(tree_to_json(root))
+    return data, '"' + hashlib.blake2b(data, digest_size=16).hexdigest() + '"'
+
+
+def scan_input_dir(path):
+    """List a directory in one pass.
+
+    Returns sorted (subdirectories, *.nwk names, *.aa.fa names); hidden
+    subdirectories are left out.
+    """
+    dirs, nwk_files, aa_files = [], [], []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            name = entry.name
+            if not name.startswith(".") and entry.is_dir():
+                dirs.append(name)
+            if name.endswith(".nwk"):
+                nwk_files.append(name)
+            elif name.endswith(".aa.fa"):
+                aa_files.append(name)
+    return sorted(dirs), sorted(nwk_files), sorted(aa_files)
 
 
 def list_dataset_files(input_dir):
@@ -324,7 +618,7 @@ def parse_numeric_value(value):
 
 def parse_dataset_file(dataset_path, tree_data):
     """Parse a tab-delimited dataset and keep only rows matching tree tips."""
-    tree_tips = set(collect_descendant_tips(tree_data))
+    tree_tips = frozenset(collect_descendant_tips(tree_data))
     with open(dataset_path, newline="") as handle:
         reader = csv.reader(handle, delimiter="\t")
         rows = list(reader)
@@ -398,8 +692,6 @@ def load_data(input_dir_str, nwk_file=None, aa_file=None):
 
     Returns (success: bool, error_message: str | None).
     """
-    global _node_counter
-
     # Resolve relative paths against the project root (parent of src/)
     PROJECT_ROOT = Path(__file__).resolve().parent.parent
     input_path = Path(input_dir_str)
@@ -409,18 +701,24 @@ def load_data(input_dir_str, nwk_file=None, aa_file=None):
     if not input_dir.is_dir():
         return False, f"Directory not found: {input_dir}"
 
+    # Auto-detection needs the directory listing; take it in a single pass
+    if not nwk_file or aa_file is None:
+        try:
+            _, nwk_names, aa_names = scan_input_dir(input_dir)
+        except PermissionError:
+            nwk_names, aa_names = [], []
+
     # --- Resolve tree file ---
     if nwk_file:
         nwk_path = input_dir / nwk_file
         if not nwk_path.is_file():
             return False, f"Tree file not found: {nwk_path}"
     else:
-        nwk_files = list(input_dir.glob("*.nwk"))
-        if len(nwk_files) == 0:
+        if len(nwk_names) == 0:
             return False, f"No .nwk file found in {input_dir}"
-        if len(nwk_files) > 1:
-            return False, f"Multiple .nwk files found in {input_dir}: {[f.name for f in nwk_files]}"
-        nwk_path = nwk_files[0]
+        if len(nwk_names) > 1:
+            return False, f"Multiple .nwk files found in {input_dir}: {nwk_names}"
+        nwk_path = input_dir / nwk_names[0]
 
     # --- Resolve alignment file ---
     if aa_file is not None:
@@ -429,10 +727,9 @@ def load_data(input_dir_str, nwk_file=None, aa_file=None):
         if aa_path and not aa_path.is_file():
             return False, f"Alignment file not found: {aa_path}"
     else:
-        aa_files = list(input_dir.glob("*.aa.fa"))
-        if len(aa_files) > 1:
-            return False, f"Multiple *.aa.fa files found in {input_dir}: {[f.name for f in aa_files]}"
-        aa_path = aa_files[0] if aa_files else None
+        if len(aa_names) > 1:
+            return False, f"Multiple *.aa.fa files found in {input_dir}: {aa_names}"
+        aa_path = input_dir / aa_names[0] if aa_names else None
 
     nwk_file = nwk_path  # rename for rest of function
     aa_file = aa_path
@@ -440,9 +737,6 @@ def load_data(input_dir_str, nwk_file=None, aa_file=None):
     # Derive gene name from .nwk filename (strip extension)
     gene = nwk_file.stem
 
-    # Reset parser state
-    _node_counter = 0
-
     # Parse tree
     print(f"Loading tree from {nwk_file.name}...")
     with open(nwk_file) as f:
@@ -453,38 +747,58 @@ def load_data(input_dir_str, nwk_file=None, aa_file=None):
     if aa_file:
         print(f"Loading protein sequences from {aa_file.name}...")
         protein_seqs = parse_fasta(str(aa_file))
-        protein_seqs_ungapped = {k: v.replace("-", "") for k, v in protein_seqs.items()}
     else:
         print("No *.aa.fa found, skipping alignment.")
-        protein_seqs, protein_seqs_ungapped = None, None
+        protein_seqs = None
 
     # Species mapping (optional — skip if orthofinder-input/ missing)
     ortho_dir = input_dir / "orthofinder-input"
     if ortho_dir.is_dir():
         print("Building species map...")
         species_to_tips, tip_to_species = build_species_map(tree_data, ortho_dir)
+        species_bits = assign_species_bits(species_to_tips)
         print("Annotating tree with species...")
-        annotate_species(tree_data, tip_to_species)
+        annotate_species(tree_data, tip_to_species, species_bits)
     else:
         print("No orthofinder-input/ found, skipping species mapping.")
-        species_to_tips, tip_to_species = {}, {}
+        species_to_tips, tip_to_species, species_bits = {}, {}, {}
 
-    tree_json = tree_to_json(tree_data)
+    tree_json_bytes, tree_etag = encode_tree(tree_data)
+    node_by_id, parent_by_id = index_tree(tree_data)
+    tip_order = precompute_tips(tree_data)
+    species_scan = flatten_species_masks(tree_data, species_bits)
     dataset_files = list_dataset_files(input_dir)
 
     # Update global state
     has_fasta = protein_seqs is not None
+    # These responses never change for a loaded dataset, so encode them once
+    species_json_bytes = orjson.dumps({
+        "species": sorted(species_to_tips),
+        "species_to_tips": species_to_tips,
+    })
+    tip_names_json_bytes = orjson.dumps({"tips": sorted(protein_seqs) if has_fasta else []})
     state.update({
         "loaded": True,
         "has_fasta": has_fasta,
         "input_dir": str(input_dir),
         "gene": gene,
         "tree_data": tree_data,
-        "tree_json": tree_json,
+        "tree_json_bytes": tree_json_bytes,
+        "tree_etag": tree_etag,
+        "tree_flat_json_bytes": None,
+        "node_by_id": node_by_id,
+        "parent_by_id": parent_by_id,
+        "tip_order": tip_order,
         "protein_seqs": protein_seqs,
-        "protein_seqs_ungapped": protein_seqs_ungapped,
+        "ungapped_corpus": None,
+        "fasta_records": {},
         "species_to_tips": species_to_tips,
         "tip_to_species": tip_to_species,
+        "species_bits": species_bits,
+        "species_scan": species_scan,
+        "species_json_bytes": species_json_bytes,
+        "tip_names_json_bytes": tip_names_json_bytes,
+        "tip_lengths_json_bytes": None,
         "num_seqs": len(protein_seqs) if has_fasta else 0,
         "num_species": len(species_to_tips),
         "nwk_name": nwk_file.name,
@@ -499,161 +813,252 @@ def load_data(input_dir_str, nwk_file=None, aa_file=None):
 # ---------------------------------------------------------------------------
 # Tree traversal helpers
 # ---------------------------------------------------------------------------
-def find_node_by_id(node, target_id):
-    """Find a node in the tree by its ID."""
-    if node["id"] == target_id:
-        return node
-    for c in node.get("children", []):
-        result = find_node_by_id(c, target_id)
-        if result:
-            return result
-    return None
-
-
-def reroot_tree(tree_data, target_id):
-    """Re-root the tree at the node with the given ID.
+def index_tree(root):
+    """Index every node under root.
 
-    Returns the new root node, or None if target_id not found.
+    Returns ({node id: node}, {node id: parent node}); the root has no
+    entry in the parent index.
     """
-    global _node_counter
-
-    if tree_data["id"] == target_id:
-        return tree_data  # already the root — no-op
+    node_by_id = {}
+    parent_by_id = {}
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        node_by_id[node.id] = node
+        for c in node.children:
+            parent_by_id[c.id] = node
+        stack.extend(node.children)
+    return node_by_id, parent_by_id
+
+
+def precompute_tips(root):
+    """Record each node's descendant tips as a span of the tree's tip order.
+
+    Tips under any node are contiguous in left-to-right order, so each node
+    gets node.tip_span = (start, end) into the returned list instead of
+    its own copy of the names.
+    """
+    tip_order = []
+    stack = [(root, None)]
+    while stack:
+        node, start = stack.pop()
+        if start is not None:
+            node.tip_span = (start, len(tip_order))
+        elif not node.children:
+            node.tip_span = (len(tip_order), len(tip_order) + 1)
+            tip_order.append(node.name)
+        else:
+            stack.append((node, len(tip_order)))
+            stack.extend((c, None) for c in reversed(node.children))
+    return tip_order
 
-    # Build parent map and find path from root to target
-    parent_map = {}  # child_id → parent_node
 
-    def build_parent_map(node):
-        for c in node["children"]:
-            parent_map[c["id"]] = node
-            build_parent_map(c)
+def reroot_tree(tree_data, target_id, node_by_id, parent_by_id):
+    """Re-root the tree at the node with the given ID.
 
-    build_parent_map(tree_data)
+    node_by_id and parent_by_id are the tree's indexes from index_tree.
+    Returns (new root, node_by_id, parent_by_id) with the indexes rebuilt
+    for the new ids, or None if target_id not found.
+    """
+    if tree_data.id == target_id:
+        return tree_data, node_by_id, parent_by_id  # already the root — no-op
 
     # Find target node
-    target = find_node_by_id(tree_data, target_id)
+    target = node_by_id.get(target_id)
     if target is None:
         return None
 
     # Build path from target back to root
     path = [target]
     cur = target
-    while cur["id"] in parent_map:
-        cur = parent_map[cur["id"]]
+    while cur.id in parent_by_id:
+        cur = parent_by_id[cur.id]
         path.append(cur)
     # path is [target, ..., root]
 
     # Save original branch lengths before modifying
-    orig_bls = [node["branch_length"] for node in path]
+    orig_bls = [node.branch_length for node in path]
 
     # Reverse parent-child relationships along the path
     for i in range(len(path) - 1):
         child = path[i]
         parent = path[i + 1]
         # Remove child from parent's children
-        parent["children"] = [c for c in parent["children"] if c["id"] != child["id"]]
+        parent.children = [c for c in parent.children if c.id != child.id]
         # Add parent as child of child
-        child["children"].append(parent)
+        child.children.append(parent)
 
     # Fix branch lengths: original edge path[i+1]→path[i] had length orig_bls[i]
     # In the reversed tree, path[i]→path[i+1] keeps that same length
     for i in range(len(path) - 1):
-        path[i + 1]["branch_length"] = orig_bls[i]
-    target["branch_length"] = 0.0
+        path[i + 1].branch_length = orig_bls[i]
+    target.branch_length = 0.0
 
     # Collapse degree-2 old root if needed (now at end of path)
     old_root = path[-1]
-    if len(old_root["children"]) == 1:
-        only_child = old_root["children"][0]
-        only_child["branch_length"] += old_root["branch_length"]
+    if len(old_root.children) == 1:
+        only_child = old_root.children[0]
+        only_child.branch_length += old_root.branch_length
         # If old_root had support, transfer to child if child has none
-        if old_root.get("support") is not None and only_child.get("support") is None:
-            only_child["support"] = old_root["support"]
+        if old_root.support is not None and only_child.support is None:
+            only_child.support = old_root.support
         # Replace old_root with only_child in its parent
         # The parent of old_root in the new tree is path[-2]
         if len(path) >= 2:
             new_parent = path[-2]
-            new_parent["children"] = [
-                only_child if c["id"] == old_root["id"] else c
-                for c in new_parent["children"]
+            new_parent.children = [
+                only_child if c.id == old_root.id else c
+                for c in new_parent.children
             ]
 
-    # Re-assign IDs to the whole tree
-    _node_counter = 0
+    # Re-assign IDs to the whole tree in preorder, re-indexing as we go
+    node_by_id = {}
+    parent_by_id = {}
+    stack = [(target, None)]
+    while stack:
+        node, parent = stack.pop()
+        nid = len(node_by_id)
+        node.id = nid
+        node_by_id[nid] = node
+        if parent is not None:
+            parent_by_id[nid] = parent
+        stack.extend((c, node) for c in reversed(node.children))
 
-    def reassign_ids(node):
-        global _node_counter
-        node["id"] = _node_counter
-        _node_counter += 1
-        for c in node["children"]:
-            reassign_ids(c)
-
-    reassign_ids(target)
-
-    return target
+    return target, node_by_id, parent_by_id
 
 
 def collect_descendant_tips(node):
     """Collect all descendant tip names from a node."""
-    if not node["children"]:
-        return [node["name"]]
     tips = []
-    for c in node["children"]:
-        tips.extend(collect_descendant_tips(c))
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        if n.children:
+            stack.extend(reversed(n.children))
+        else:
+            tips.append(n.name)
     return tips
 
 
 def node_to_newick(node):
-    """Convert a tree node dict back to a Newick string."""
-    children = node.get("children", [])
-    if children:
-        child_strs = ",".join(node_to_newick(c) for c in children)
-        s = f"({child_strs})"
-        if node.get("support") is not None:
-            s += str(node["support"])
-        elif node.get("name"):
-            s += node["name"]
-    else:
-        s = node.get("name", "")
-    bl = node.get("branch_length")
-    if bl is not None and bl != 0:
-        s += f":{bl}"
-    return s
+    """Convert a tree node back to a Newick string.
+
+    The stack holds nodes still to be written and the literal text (commas
+    and closing labels) to emit between them; pieces are joined once.
+    """
+    out = []
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            out.append(item)
+            continue
+        bl = item.branch_length
+        suffix = f":{bl}" if bl is not None and bl != 0 else ""
+        if item.children:
+            label = str(item.support) if item.support is not None else item.name
+            stack.append(")" + label + suffix)
+            for i, c in enumerate(reversed(item.children)):
+                if i:
+                    stack.append(",")
+                stack.append(c)
+            out.append("(")
+        else:
+            out.append(item.name + suffix)
+    return "".join(out)
+
+
+@lru_cache(maxsize=32)
+def residue_columns(ref_seq_gapped):
+    """Return the alignment column index of each residue in a gapped sequence."""
+    return [col_idx for col_idx, char in enumerate(ref_seq_gapped) if char != "-"]
 
 
 def ref_pos_to_columns(ref_seq_gapped, ref_start, ref_end):
-    """Map 1-indexed reference residue positions to alignment column indices."""
-    col_start = None
-    col_end = None
-    residue_pos = 0
-    for col_idx, char in enumerate(ref_seq_gapped):
-        if char != "-":
-            residue_pos += 1
-            if residue_pos == ref_start and col_start is None:
-                col_start = col_idx
-            if residue_pos == ref_end:
-                col_end = col_idx + 1
-                break
-    return col_start, col_end
+    """Map 1-indexed reference residue positions to alignment column indices.
+
+    Returns (None, None) if the positions fall outside the reference.
+    """
+    cols = residue_columns(ref_seq_gapped)
+    if not 1 <= ref_start <= ref_end <= len(cols):
+        return None, None
+    return cols[ref_start - 1], cols[ref_end - 1] + 1
+
+
+# Maps "-" to 0 and every other byte to 1
+_NON_GAP_BYTES = bytes(0 if c == ord("-") else 1 for c in range(256))
+
+
+def count_identity(seq1, seq2):
+    """Return (identical, aligned) column counts for two aligned sequences.
+
+    Columns with a gap in either sequence are not aligned. ASCII sequences
+    are compared whole, as big integers, instead of one character at a time.
+    """
+    if not (seq1.isascii() and seq2.isascii()):
+        identical = aligned = 0
+        for a, b in zip(seq1, seq2):
+            if a != "-" and b != "-":
+                aligned += 1
+                identical += a == b
+        return identical, aligned
+
+    b1, b2 = seq1.encode(), seq2.encode()
+    n = len(b1)
+    # One byte per column: 1 where the sequence has a residue, 0 at a gap
+    res1 = int.from_bytes(b1.translate(_NON_GAP_BYTES), "big")
+    res2 = int.from_bytes(b2.translate(_NON_GAP_BYTES), "big")
+    aligned = (res1 & res2).bit_count()
+    both_gaps = n - (res1 | res2).bit_count()
+    # Equal columns XOR to a zero byte; gap-gap columns are among them
+    equal = (int.from_bytes(b1, "big") ^ int.from_bytes(b2, "big")).to_bytes(n, "big").count(0)
+    return equal - both_gaps, aligned
 
 
 # ---------------------------------------------------------------------------
-# Helper: require data loaded
+# Helper: JSON responses and require data loaded
 # ---------------------------------------------------------------------------
+class OrjsonResponse(Response):
+    """JSON response encoded with orjson; the app's default response class."""
+
+    media_type = "application/json"
+
+    def render(self, content):
+        return orjson.dumps(content)
+
+
+def not_loaded_response():
+    """Return the JSON error sent when no dataset is loaded."""
+    return OrjsonResponse(
+        status_code=400,
+        content={"error": "No data loaded. Use the setup dialog to load an input folder."},
+    )
+
+
 def require_loaded():
-    """Return a JSONResponse error if data not loaded, else None."""
+    """Return a JSON error response if data not loaded, else None."""
     if not state["loaded"]:
-        return JSONResponse(
-            status_code=400,
-            content={"error": "No data loaded. Use the setup dialog to load an input folder."},
-        )
+        return not_loaded_response()
     return None
 
 
 # ---------------------------------------------------------------------------
 # FastAPI app
 # ---------------------------------------------------------------------------
-app = FastAPI(title="PhyloScope")
+app = FastAPI(title="PhyloScope", default_response_class=OrjsonResponse)
+
+# CPU-heavy endpoints that only read the alignment or the species masks are
+# plain `def`, so FastAPI runs them in its threadpool. Endpoints that walk the
+# tree stay `async`: /api/reroot edits nodes in place on the event loop and
+# must not interleave with them.
+#
+# /api/load parses in a worker thread, so it could otherwise replace the
+# dataset halfway through a reroot. Every endpoint that writes state holds
+# this lock; being an asyncio lock, waiting on it never blocks the loop.
+# Readers do not take it, so a load or reset can still land mid-request:
+# they read each per-dataset value once (protein_seqs, species_scan) and
+# work from that snapshot, and lazy caches remember what they were built from.
+state_write_lock = asyncio.Lock()
 
 STATIC_DIR = Path(__file__).parent / "static"
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
@@ -679,18 +1084,15 @@ async def api_browse(path: Optional[str] = Query(None)):
         browse_path = PROJECT_ROOT
 
     if not browse_path.is_dir():
-        return JSONResponse(status_code=400, content={"error": f"Not a directory: {browse_path}"})
+        return OrjsonResponse(status_code=400, content={"error": f"Not a directory: {browse_path}"})
 
     try:
-        dirs = sorted(
-            entry.name for entry in browse_path.iterdir()
-            if entry.is_dir() and not entry.name.startswith(".")
-        )
+        dirs, nwk_names, aa_names = scan_input_dir(browse_path)
     except PermissionError:
-        return JSONResponse(status_code=403, content={"error": f"Permission denied: {browse_path}"})
+        return OrjsonResponse(status_code=403, content={"error": f"Permission denied: {browse_path}"})
 
-    has_nwk = any(browse_path.glob("*.nwk"))
-    has_aa_fa = any(browse_path.glob("*.aa.fa"))
+    has_nwk = bool(nwk_names)
+    has_aa_fa = bool(aa_names)
 
     parent = str(browse_path.parent) if browse_path.parent != browse_path else None
 
@@ -719,10 +1121,12 @@ async def api_browse_files(path: str = Query(..., description="Directory to scan
         p = PROJECT_ROOT / p
     p = p.resolve()
     if not p.is_dir():
-        return JSONResponse(status_code=400, content={"error": f"Not a directory: {p}"})
+        return OrjsonResponse(status_code=400, content={"error": f"Not a directory: {p}"})
 
-    nwk_files = sorted(f.name for f in p.glob("*.nwk"))
-    aa_files = sorted(f.name for f in p.glob("*.aa.fa"))
+    try:
+        _, nwk_files, aa_files = scan_input_dir(p)
+    except PermissionError:
+        nwk_files, aa_files = [], []
     has_ortho = (p / "orthofinder-input").is_dir()
     dataset_files = list_dataset_files(p)
 
@@ -739,14 +1143,18 @@ async def api_load(request: Request):
     body = await request.json()
     input_dir = body.get("input_dir", "").strip()
     if not input_dir:
-        return JSONResponse(status_code=400, content={"error": "input_dir is required"})
+        return OrjsonResponse(status_code=400, content={"error": "input_dir is required"})
 
     nwk_file = body.get("nwk_file")  # filename or None
     aa_file = body.get("aa_file")    # filename, "" to skip, or None
 
-    success, error = load_data(input_dir, nwk_file=nwk_file, aa_file=aa_file)
+    # Parsing can take seconds; keep the event loop serving other requests
+    async with state_write_lock:
+        success, error = await run_in_threadpool(
+            load_data, input_dir, nwk_file=nwk_file, aa_file=aa_file
+        )
     if not success:
-        return JSONResponse(status_code=400, content={"error": error})
+        return OrjsonResponse(status_code=400, content={"error": error})
 
     return loaded_status_payload()
 
@@ -754,41 +1162,96 @@ async def api_load(request: Request):
 @app.post("/api/reset")
 async def api_reset():
     """Reset state so user can load a new dataset."""
-    state.update(EMPTY_STATE)
+    async with state_write_lock:
+        state.update(EMPTY_STATE)
     return {"ok": True}
 
 
 @app.post("/api/reroot")
 async def api_reroot(request: Request):
     """Re-root the tree at the specified node."""
-    err = require_loaded()
-    if err:
-        return err
-    body = await request.json()
-    node_id = body.get("node_id")
-    if node_id is None:
-        return JSONResponse(status_code=400, content={"error": "node_id is required"})
-
-    new_root = reroot_tree(state["tree_data"], int(node_id))
-    if new_root is None:
-        return JSONResponse(status_code=404, content={"error": "Node not found"})
-
-    # Re-annotate species if mapping exists
-    if state["tip_to_species"]:
-        annotate_species(new_root, state["tip_to_species"])
-
-    state["tree_data"] = new_root
-    state["tree_json"] = tree_to_json(new_root)
+    async with state_write_lock:
+        err = require_loaded()
+        if err:
+            return err
+        body = await request.json()
+        node_id = body.get("node_id")
+        if node_id is None:
+            return OrjsonResponse(status_code=400, content={"error": "node_id is required"})
+
+        rerooted = reroot_tree(
+            state["tree_data"], int(node_id), state["node_by_id"], state["parent_by_id"]
+        )
+        if rerooted is None:
+            return OrjsonResponse(status_code=404, content={"error": "Node not found"})
+        new_root, node_by_id, parent_by_id = rerooted
+
+        # Re-annotate species if mapping exists
+        if state["tip_to_species"]:
+            annotate_species(new_root, state["tip_to_species"], state["species_bits"])
+
+        tree_json_bytes, tree_etag = encode_tree(new_root)
+        # Publish the new tree and everything derived from it in one step
+        state.update({
+            "tree_data": new_root,
+            "tree_json_bytes": tree_json_bytes,
+            "tree_etag": tree_etag,
+            "tree_flat_json_bytes": None,
+            "node_by_id": node_by_id,
+            "parent_by_id": parent_by_id,
+            "tip_order": precompute_tips(new_root),
+            "species_scan": flatten_species_masks(new_root, state["species_bits"]),
+        })
 
-    return {"tree": state["tree_json"]}
+    return Response(
+        content=b'{"tree":' + tree_json_bytes + b"}",
+        media_type="application/json",
+    )
 
 
 @app.get("/api/tree")
-async def get_tree():
+async def get_tree(
+    request: Request,
+    format: str = Query("nested", description="'nested' or 'flat' (parallel arrays)"),
+):
     err = require_loaded()
     if err:
         return err
-    return state["tree_json"]
+    if format not in ("nested", "flat"):
+        return OrjsonResponse(status_code=400, content={"error": f"Unknown tree format: {format}"})
+
+    # Loads publish from a worker thread; take the tree, its tag and its
+    # encoding from a single publication
+    while True:
+        root = state["tree_data"]
+        etag = state["tree_etag"]
+        nested = state["tree_json_bytes"]
+        if state["tree_data"] is root:
+            break
+    if root is None:
+        return not_loaded_response()
+    if format == "flat":
+        # Same tree, different body: derive its tag from the nested one
+        etag = etag[:-1] + '-flat"'
+
+    if_none_match = request.headers.get("if-none-match", "")
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    if etag in tags or "*" in tags:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    if format == "flat":
+        # Cached as (root, body) so an encode racing a load is never served
+        # for, or stored over, the new tree
+        cached = state["tree_flat_json_bytes"]
+        if cached is not None and cached[0] is root:
+            data = cached[1]
+        else:
+            data = orjson.dumps(tree_to_flat(root))
+            if state["tree_data"] is root:
+                state["tree_flat_json_bytes"] = (root, data)
+    else:
+        data = nested
+    return Response(content=data, media_type="application/json", headers={"ETag": etag})
 
 
 @app.get("/api/species")
@@ -796,14 +1259,11 @@ async def get_species():
     err = require_loaded()
     if err:
         return err
-    return {
-        "species": sorted(state["species_to_tips"].keys()),
-        "species_to_tips": state["species_to_tips"],
-    }
+    return Response(content=state["species_json_bytes"], media_type="application/json")
 
 
 @app.get("/api/motif")
-async def search_motif(
+def search_motif(
     pattern: str = Query(..., description="Regex or PROSITE pattern"),
     type: str = Query("regex", description="'regex' or 'prosite'"),
 ):
@@ -811,32 +1271,38 @@ async def search_motif(
     if err:
         return err
 
-    if not state["has_fasta"]:
+    # Read the alignment once: a reset or load may replace it mid-request
+    seqs = state["protein_seqs"]
+    if seqs is None:
         return {"matched_tips": [], "error": "No alignment loaded"}
 
+    flags = re.IGNORECASE | re.MULTILINE
     if type == "prosite":
         try:
             regex_str = prosite_to_regex(pattern)
         except Exception as e:
             return {"error": f"Invalid PROSITE pattern: {e}", "matched_tips": []}
+        # PROSITE only names ASCII residues; skip Unicode case folding
+        flags |= re.ASCII
     else:
         regex_str = pattern
 
     try:
-        compiled = re.compile(regex_str, re.IGNORECASE)
+        compiled = compile_motif_regex(regex_str, flags)
     except re.error as e:
         return {"error": f"Invalid regex: {e}", "matched_tips": []}
 
-    matched = [
-        tip
-        for tip, seq in state["protein_seqs_ungapped"].items()
-        if compiled.search(seq)
-    ]
+    corpus, starts, tips, uppercase = get_ungapped_corpus(seqs)
+    if uppercase and regex_str.isascii() and regex_str.isalpha():
+        # A plain residue string: a substring search beats the regex engine
+        matched = scan_literal(regex_str.upper(), corpus, starts, tips)
+    else:
+        matched = scan_motif(compiled, corpus, starts, tips)
     return {"matched_tips": sorted(matched), "pattern_used": regex_str}
 
 
 @app.get("/api/nodes-by-species")
-async def nodes_by_species(
+def nodes_by_species(
     species: list[str] = Query(..., description="Species to require"),
     exclude: list[str] = Query([], description="Species to exclude"),
 ):
@@ -845,7 +1311,7 @@ async def nodes_by_species(
         return err
     required = set(species)
     excluded = set(exclude)
-    node_ids = find_nodes_with_species(state["tree_data"], required, excluded)
+    node_ids = find_nodes_with_species(state["species_scan"], required, excluded)
     return {"highlighted_nodes": node_ids}
 
 
@@ -854,11 +1320,11 @@ async def node_tips(node_id: int = Query(..., description="Node ID")):
     err = require_loaded()
     if err:
         return err
-    node = find_node_by_id(state["tree_data"], node_id)
+    node = state["node_by_id"].get(node_id)
     if not node:
         return {"error": "Node not found", "tips": []}
-    tips = collect_descendant_tips(node)
-    return {"tips": tips}
+    start, end = node.tip_span
+    return {"tips": state["tip_order"][start:end]}
 
 
 @app.get("/api/export-newick")
@@ -867,15 +1333,15 @@ async def export_newick(node_id: int = Query(..., description="Node ID")):
     err = require_loaded()
     if err:
         return err
-    node = find_node_by_id(state["tree_data"], node_id)
+    node = state["node_by_id"].get(node_id)
     if not node:
-        return JSONResponse(status_code=404, content={"error": "Node not found"})
+        return OrjsonResponse(status_code=404, content={"error": "Node not found"})
     nwk = node_to_newick(node) + ";"
     return PlainTextResponse(content=nwk, media_type="text/plain")
 
 
 @app.get("/api/pairwise")
-async def api_pairwise(
+def api_pairwise(
     tip1: str = Query(..., description="First tip name"),
     tip2: str = Query(..., description="Second tip name"),
 ):
@@ -883,10 +1349,10 @@ async def api_pairwise(
     err = require_loaded()
     if err:
         return err
-    if not state["has_fasta"]:
-        return JSONResponse(status_code=400, content={"error": "No alignment loaded"})
-
     seqs = state["protein_seqs"]
+    if seqs is None:
+        return OrjsonResponse(status_code=400, content={"error": "No alignment loaded"})
+
     if tip1 not in seqs:
         return {"error": f"Tip '{tip1}' not found in alignment"}
     if tip2 not in seqs:
@@ -897,15 +1363,7 @@ async def api_pairwise(
     if len(seq1) != len(seq2):
         return {"error": "Sequences have different lengths in alignment"}
 
-    identical = 0
-    aligned = 0
-    for a, b in zip(seq1, seq2):
-        if a == "-" or b == "-":
-            continue
-        aligned += 1
-        if a == b:
-            identical += 1
-
+    identical, aligned = count_identity(seq1, seq2)
     identity = identical / aligned if aligned > 0 else 0.0
     return {
         "identity": identity,
@@ -915,14 +1373,25 @@ async def api_pairwise(
 
 
 @app.get("/api/tip-lengths")
-async def tip_lengths():
+def tip_lengths():
     """Return ungapped sequence lengths for all tips."""
     err = require_loaded()
     if err:
         return err
-    if not state["has_fasta"]:
+    seqs = state["protein_seqs"]
+    if seqs is None:
         return {}
-    return {k: len(v) for k, v in state["protein_seqs_ungapped"].items()}
+    # Lengths are fixed for an alignment; encode them on first use and cache
+    # them as (alignment, body) like the corpus
+    cached = state["tip_lengths_json_bytes"]
+    if cached is not None and cached[0] is seqs:
+        data = cached[1]
+    else:
+        _, starts, tips, _ = get_ungapped_corpus(seqs)
+        data = orjson.dumps({tip: starts[i + 1] - starts[i] - 1 for i, tip in enumerate(tips)})
+        if state["protein_seqs"] is seqs:
+            state["tip_lengths_json_bytes"] = (seqs, data)
+    return Response(content=data, media_type="application/json")
 
 
 @app.get("/api/tip-seq")
@@ -931,12 +1400,13 @@ async def tip_seq(name: str = Query(..., description="Tip name")):
     err = require_loaded()
     if err:
         return err
-    if not state["has_fasta"]:
-        return JSONResponse(status_code=404, content={"error": "No alignment loaded"})
-    seq = state["protein_seqs_ungapped"].get(name)
+    seqs = state["protein_seqs"]
+    if seqs is None:
+        return OrjsonResponse(status_code=404, content={"error": "No alignment loaded"})
+    seq = seqs.get(name)
     if seq is None:
-        return JSONResponse(status_code=404, content={"error": f"Tip '{name}' not found"})
-    return {"name": name, "seq": seq}
+        return OrjsonResponse(status_code=404, content={"error": f"Tip '{name}' not found"})
+    return {"name": name, "seq": seq.replace("-", "")}
 
 
 @app.get("/api/tip-names")
@@ -945,9 +1415,7 @@ async def tip_names():
     err = require_loaded()
     if err:
         return err
-    if not state["has_fasta"]:
-        return {"tips": []}
-    return {"tips": sorted(state["protein_seqs"].keys())}
+    return Response(content=state["tip_names_json_bytes"], media_type="application/json")
 
 
 @app.get("/api/datasets")
@@ -966,14 +1434,14 @@ async def get_dataset(name: str = Query(..., description="Dataset filename")):
     if err:
         return err
     if not name:
-        return JSONResponse(status_code=400, content={"error": "name is required"})
+        return OrjsonResponse(status_code=400, content={"error": "name is required"})
     if name not in state["dataset_files"]:
-        return JSONResponse(status_code=404, content={"error": f"Dataset not found: {name}"})
+        return OrjsonResponse(status_code=404, content={"error": f"Dataset not found: {name}"})
 
     dataset_path = Path(state["input_dir"]) / "dataset" / name
     parsed, error = parse_dataset_file(dataset_path, state["tree_data"])
     if error:
-        return JSONResponse(status_code=400, content={"error": error})
+        return OrjsonResponse(status_code=400, content={"error": error})
     return parsed
 
 
@@ -990,14 +1458,16 @@ async def export_alignment(
     err = require_loaded()
     if err:
         return err
-    if not state["has_fasta"]:
+    protein_seqs = state["protein_seqs"]
+    if protein_seqs is None:
         return Response("No alignment loaded", status_code=400)
 
-    node = find_node_by_id(state["tree_data"], node_id)
+    node = state["node_by_id"].get(node_id)
     if not node:
         return Response("Node not found", status_code=404)
 
-    tips = collect_descendant_tips(node)
+    start, end = node.tip_span
+    tips = state["tip_order"][start:end]
     tip_set = set(tips)
     all_tips = list(tips)
     for t in extra_tips:
@@ -1009,8 +1479,6 @@ async def export_alignment(
     slice_start = None
     slice_end = None
 
-    protein_seqs = state["protein_seqs"]
-
     if ref_seq and ref_start is not None and ref_end is not None:
         if ref_seq not in protein_seqs:
             return Response(f"Reference sequence '{ref_seq}' not found", status_code=400)
@@ -1021,21 +1489,41 @@ async def export_alignment(
         slice_start = col_start - 1
         slice_end = col_end
 
-    # Build FASTA
-    lines = []
-    for tip in all_tips:
-        if tip not in protein_seqs:
-            continue
-        seq = protein_seqs[tip]
-        if slice_start is not None and slice_end is not None:
-            seq = seq[slice_start:slice_end]
-        lines.append(f">{tip}")
-        for i in range(0, len(seq), 80):
-            lines.append(seq[i:i + 80])
-
-    fasta_content = "\n".join(lines) + "\n"
-    return Response(
-        content=fasta_content,
+    # Stream FASTA records as encoded bytes. Full-length records never change
+    # for a loaded alignment, so they are formatted once and reused.
+    records = state["fasta_records"]
+    if state["protein_seqs"] is not protein_seqs:
+        records = {}  # a load landed since protein_seqs was read; don't mix caches
+
+    def generate_fasta():
+        # Each chunk of a sync generator costs a threadpool round trip, so
+        # batch records instead of yielding them one by one
+        batch = []
+        size = 0
+        for tip in all_tips:
+            if slice_start is not None and slice_end is not None:
+                seq = protein_seqs.get(tip)
+                if seq is None:
+                    continue
+                record = format_fasta_record(tip, seq[slice_start:slice_end])
+            else:
+                record = records.get(tip)
+                if record is None:
+                    seq = protein_seqs.get(tip)
+                    if seq is None:
+                        continue
+                    record = records[tip] = format_fasta_record(tip, seq)
+            batch.append(record)
+            size += len(record)
+            if size >= FASTA_CHUNK_SIZE:
+                yield b"".join(batch)
+                batch = []
+                size = 0
+        if batch:
+            yield b"".join(batch)
+
+    return StreamingResponse(
+        generate_fasta(),
         media_type="text/plain",
         headers={"Content-Disposition": f"attachment; filename=export_node{node_id}.fasta"},
     )